@@ -1,11 +1,18 @@
-from flask import Flask, jsonify, render_template, request, send_file
+from flask import Flask, jsonify, render_template, request, send_file, url_for
+import atexit
 import base64
+import hashlib
 import io
 import json
 import os
 import re
 import requests as req_lib
+import tempfile
+import threading
+import time
 import urllib.request
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date, datetime
 from io import BytesIO
 from pathlib import Path
@@ -25,6 +32,13 @@ try:
 except ImportError:
     pass
 
+# Faster JSON parsing for Claude replies (optional)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 import anthropic
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -75,7 +89,7 @@ TEMPLATES_FILE = _resolve_templates_path()
 if not TEMPLATES_FILE.exists():
     TEMPLATES_FILE.parent.mkdir(parents=True, exist_ok=True)
     TEMPLATES_FILE.write_text("{}")
-TRAINING_PDF_CACHE = {}  # supplier -> base64 pdf data (temporary, per-session)
+TRAINING_PDF_CACHE = {}  # supplier -> Claude document source (temporary, per-session)
 
 
 def _load_templates():
@@ -984,11 +998,13 @@ def _build_review_pdf(payload: dict) -> BytesIO:
     buffer.seek(0)
     return buffer
 
+# First "{" through last "}" — strips markdown fences or chatter around the object
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
 def _clean_json_payload(raw_text: str):
-    payload = raw_text.strip()
-    if "```" in payload and "{" in payload and "}" in payload:
-        payload = payload[payload.find("{") : payload.rfind("}") + 1]
-    return json.loads(payload)
+    match = _JSON_OBJECT_RE.search(raw_text)
+    return _json_loads(match.group(0) if match else raw_text)
 
 
 def _normalise_data(data: dict):
@@ -1112,82 +1128,361 @@ def save_review():
     return jsonify({"success": True, "message": "Review saved.", "data": payload})
 
 
+_BROKER_ROWS = [{"name": name, "address": address} for name, address in BROKERS.items()]
+_BROKERS_JSON = json.dumps(_BROKER_ROWS)
+
+
 @app.route("/")
 def index():
-    brokers = [{"name": name, "address": address} for name, address in BROKERS.items()]
-    return render_template("index.html", brokers_json=json.dumps(brokers))
+    return render_template("index.html", brokers_json=_BROKERS_JSON)
 
 
-@app.route("/extract", methods=["POST"])
-def extract():
-    if "pdf" not in request.files:
-        return jsonify({"error": "No PDF uploaded"}), 400
+# ─── Background extraction jobs ──────────────────────────────────────────────
+# A Claude call takes several seconds, and a sync gunicorn worker is blocked for
+# all of it. With `async=true` in the form, /extract hands the call to a thread
+# pool and answers 202 straight away; the browser polls /extract/<job_id>.
+# Job state lives in small JSON files so whichever worker gets the poll can
+# answer it, not just the one that accepted the upload.
+EXTRACT_JOBS_DIR = Path(
+    os.environ.get("EXTRACT_JOBS_PATH") or Path(tempfile.gettempdir()) / "pdf-extractor-jobs"
+)
+EXTRACT_JOBS_DIR.mkdir(parents=True, exist_ok=True)
+EXTRACT_JOB_TTL = 60 * 60  # seconds a finished job stays pollable
+# The executor is per process: if the worker that owns a job restarts, its
+# record stays queued/running forever. One untouched for this long is failed.
+EXTRACT_JOB_STALE = 10 * 60  # seconds
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+_extract_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("EXTRACT_WORKERS", "4")),
+    thread_name_prefix="extract",
+)
+_anthropic_client = None
 
-    api_key = os.environ.get("ANTHROPIC_API_KEY", "")
-    if not api_key:
-        return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 500
+# Single-flight: when the same PDF is uploaded again while Claude is still
+# reading the first copy, the second request waits on that call instead of
+# paying for its own. Keyed by (PDF sha256, prompt); per worker process.
+_INFLIGHT = {}
+_inflight_lock = threading.Lock()
 
-    pdf_bytes = request.files["pdf"].read()
-    b64_pdf = base64.standard_b64encode(pdf_bytes).decode()
-    client = anthropic.Anthropic(api_key=api_key)
+# Files API: each distinct PDF is uploaded once and then referenced by id, so
+# retries, re-uploads and the template layout call don't resend the document.
+FILES_API_BETA = "files-api-2025-04-14"
+# Uploads are deleted again once they expire or are replaced, and when the
+# worker exits, so the org's file storage doesn't grow with every PO.
+FILE_ID_TTL = 24 * 60 * 60  # seconds before a cached upload is re-sent
+_file_id_cache = {}  # sha256 -> (file_id, uploaded_at)
+_file_id_lock = threading.Lock()  # extract jobs run on executor threads
 
-    is_training = request.form.get("training") == "true"
-    training_supplier = request.form.get("training_supplier", "")
+# Long POs: past EXTRACT_SHARD_PAGES pages the PDF is split into SHARD_COUNT
+# contiguous page ranges that Claude reads in parallel, and the per-shard JSON
+# is merged. Needs pypdf; without it every PO is sent as a single document.
+SHARD_PAGE_THRESHOLD = int(os.environ.get("EXTRACT_SHARD_PAGES", "6"))
+SHARD_COUNT = 3
+
+
+def _get_anthropic_client(api_key):
+    """Lazily create and return a shared Anthropic client (reuses its connection pool)."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        _anthropic_client = anthropic.Anthropic(api_key=api_key)
+    return _anthropic_client
 
+
+def _job_path(job_id):
+    return EXTRACT_JOBS_DIR / f"{job_id}.json"
+
+
+def _write_job(job_id, record):
+    """Persist a job record atomically so a poll never reads a half-written file."""
+    path = _job_path(job_id)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(record))
+    os.replace(tmp, path)
+
+
+def _read_job(job_id):
     try:
-        templates = _load_templates()
+        return json.loads(_job_path(job_id).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_jobs():
+    """Delete job records, and temp files left by interrupted writes, older than EXTRACT_JOB_TTL."""
+    cutoff = time.time() - EXTRACT_JOB_TTL
+    for path in EXTRACT_JOBS_DIR.iterdir():
+        if path.suffix not in (".json", ".tmp"):
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _job_is_stale(job_id):
+    """True if the job's record hasn't been written for EXTRACT_JOB_STALE seconds."""
+    try:
+        return time.time() - _job_path(job_id).stat().st_mtime > EXTRACT_JOB_STALE
+    except OSError:
+        return False
+
+
+def _cached_text(text):
+    """Prompt text block marked as a cache breakpoint.
+
+    Claude caches the request prefix up to this block for ~5 minutes, so the
+    static instructions go first and the per-PO document after them.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def _inline_source(pdf_bytes):
+    """Claude document source carrying the PDF itself as base64."""
+    return {
+        "type": "base64",
+        "media_type": "application/pdf",
+        "data": base64.standard_b64encode(pdf_bytes).decode(),
+    }
+
+
+def _delete_files(client, file_ids):
+    """Best-effort removal of uploaded files from the Files API."""
+    for file_id in file_ids:
+        try:
+            client.beta.files.delete(file_id)
+        except Exception as exc:
+            print(f"[Files API] Could not delete {file_id}: {exc}")
+
+
+def _pdf_source(client, pdf_bytes, digest):
+    """Return a Claude document source for the PDF — an uploaded file id, or inline base64 if the upload fails."""
+    now = time.time()
+    with _file_id_lock:
+        cached = _file_id_cache.get(digest)
+        if cached and now - cached[1] < FILE_ID_TTL:
+            return {"type": "file", "file_id": cached[0]}
+    try:
+        uploaded = client.beta.files.upload(file=("po.pdf", pdf_bytes, "application/pdf"))
+    except Exception as exc:
+        print(f"[Files API] Upload failed, sending PDF inline: {exc}")
+        return _inline_source(pdf_bytes)
+
+    with _file_id_lock:
+        # Expired uploads (including an old copy of this PDF) are dropped first
+        expired = [d for d, (_, at) in _file_id_cache.items() if now - at >= FILE_ID_TTL]
+        unused = [_file_id_cache.pop(d)[0] for d in expired]
+        cached = _file_id_cache.get(digest)
+        if cached:
+            # Another thread uploaded the same PDF meanwhile: use its copy
+            file_id = cached[0]
+            unused.append(uploaded.id)
+        else:
+            file_id = uploaded.id
+            _file_id_cache[digest] = (file_id, now)
+    _delete_files(client, unused)
+    return {"type": "file", "file_id": file_id}
+
+
+@atexit.register
+def _delete_cached_files():
+    """Remove this worker's uploads when it shuts down."""
+    with _file_id_lock:
+        file_ids = [file_id for file_id, _ in _file_id_cache.values()]
+        _file_id_cache.clear()
+    if file_ids and _anthropic_client is not None:
+        _delete_files(_anthropic_client, file_ids)
 
-        # Build prompt — include template hints when available
-        prompt = EXTRACT_PROMPT
-        if not is_training and templates:
-            hints = _build_all_template_hints(templates)
-            if hints:
-                prompt += "\n\n" + hints
 
-        resp = client.messages.create(
+def _split_pdf(pdf_bytes):
+    """Split a long PDF into SHARD_COUNT page ranges; short PDFs come back as [pdf_bytes]."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        return [pdf_bytes]
+    try:
+        reader = PdfReader(BytesIO(pdf_bytes))
+        page_count = len(reader.pages)
+    except Exception:
+        return [pdf_bytes]
+    if page_count <= SHARD_PAGE_THRESHOLD:
+        return [pdf_bytes]
+
+    step = -(-page_count // SHARD_COUNT)  # ceil division
+    shards = []
+    for start in range(0, page_count, step):
+        writer = PdfWriter()
+        for page in reader.pages[start : start + step]:
+            writer.add_page(page)
+        buf = BytesIO()
+        writer.write(buf)
+        shards.append(buf.getvalue())
+    return shards
+
+
+def _merge_shards(parts):
+    """Merge per-shard extractions: first non-empty value wins, line items are concatenated.
+
+    overall_total is the exception: the PO states it at the end, so the last
+    shard that reports one wins. If none does, _normalise_data re-sums the
+    merged line items.
+    """
+    merged = {"line_items": []}
+    for part in parts:
+        merged["line_items"].extend(part.get("line_items") or [])
+        for key, value in part.items():
+            if key == "line_items":
+                continue
+            if key == "overall_total":
+                if value not in (None, "", 0):
+                    merged[key] = value
+                continue
+            if value not in (None, "") and merged.get(key) in (None, ""):
+                merged[key] = value
+    return merged
+
+
+def _single_flight(key, fn):
+    """Call fn() unless a call for the same key is already running; share its result."""
+    with _inflight_lock:
+        future = _INFLIGHT.get(key)
+        owner = future is None
+        if owner:
+            future = _INFLIGHT[key] = Future()
+    if not owner:
+        return future.result()
+
+    try:
+        result = fn()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _INFLIGHT.pop(key, None)
+    future.set_result(result)
+    return result
+
+
+def _perform_extract(api_key, pdf_bytes, is_training=False, training_supplier=""):
+    """Run the Claude extraction for one PO and return the /extract response body."""
+    client = _get_anthropic_client(api_key)
+    templates = _load_templates()
+
+    # Build prompt — include template hints when available. Each part is its
+    # own cached block: the hints only change when a template is saved.
+    prompt_blocks = [_cached_text(EXTRACT_PROMPT)]
+    if not is_training and templates:
+        hints = _build_all_template_hints(templates)
+        if hints:
+            prompt_blocks.append(_cached_text(hints))
+    prompt = "\n\n".join(block["text"] for block in prompt_blocks)
+
+    def ask_claude(source):
+        resp = client.beta.messages.create(
             model="claude-opus-4-1",
             max_tokens=1800,
+            betas=[FILES_API_BETA],
             messages=[
                 {
                     "role": "user",
-                    "content": [
-                        {
-                            "type": "document",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "application/pdf",
-                                "data": b64_pdf,
-                            },
-                        },
-                        {"type": "text", "text": prompt},
-                    ],
+                    "content": [*prompt_blocks, {"type": "document", "source": source}],
                 }
             ],
         )
+        return source, resp.content[0].text
+
+    def call_claude():
+        # Training keeps the whole document: its upload is reused for the layout call
+        shards = [pdf_bytes] if is_training else _split_pdf(pdf_bytes)
+        if len(shards) == 1:
+            return [ask_claude(_pdf_source(client, pdf_bytes, digest))]
+        # Shards are sent inline: their bytes are unique to this split, so an
+        # upload would never be reused and would only be left in file storage
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            return list(pool.map(ask_claude, map(_inline_source, shards)))
+
+    # Share the raw text, not the parsed dict: _normalise_data mutates its input.
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    replies = _single_flight((digest, prompt, is_training), call_claude)
+
+    parts = [_clean_json_payload(raw_text) for _, raw_text in replies]
+    parsed = parts[0] if len(parts) == 1 else _merge_shards(parts)
+    normalised = _normalise_data(parsed)
+
+    # Cache PDF for training if applicable
+    if is_training and training_supplier:
+        TRAINING_PDF_CACHE[training_supplier] = replies[0][0]
+
+    # Determine template status for the extracted supplier
+    supplier = normalised.get("supplier", "")
+    template = templates.get(supplier)
+    confidence = _calculate_confidence(normalised, template)
 
-        parsed = _clean_json_payload(resp.content[0].text)
-        normalised = _normalise_data(parsed)
+    return {
+        "success": True,
+        "data": normalised,
+        "confidence": confidence,
+        "template_used": template is not None,
+        "supplier_trained": bool(supplier and supplier in templates),
+    }
 
-        # Cache PDF for training if applicable
-        if is_training and training_supplier:
-            TRAINING_PDF_CACHE[training_supplier] = b64_pdf
 
-        # Determine template status for the extracted supplier
-        supplier = normalised.get("supplier", "")
-        template = templates.get(supplier)
-        confidence = _calculate_confidence(normalised, template)
+def _run_extract_job(job_id, api_key, pdf_bytes, is_training, training_supplier):
+    _write_job(job_id, {"status": "running"})
+    try:
+        result = _perform_extract(api_key, pdf_bytes, is_training, training_supplier)
+    except Exception as exc:
+        _write_job(job_id, {"status": "error", "error": str(exc)})
+    else:
+        _write_job(job_id, {"status": "done", **result})
 
-        return jsonify({
-            "success": True,
-            "data": normalised,
-            "confidence": confidence,
-            "template_used": template is not None,
-            "supplier_trained": bool(supplier and supplier in templates),
-        })
+
+@app.route("/extract", methods=["POST"])
+def extract():
+    if "pdf" not in request.files:
+        return jsonify({"error": "No PDF uploaded"}), 400
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY", "")
+    if not api_key:
+        return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 500
+
+    pdf_bytes = request.files["pdf"].read()
+    is_training = request.form.get("training") == "true"
+    training_supplier = request.form.get("training_supplier", "")
+
+    if request.form.get("async") == "true":
+        _prune_jobs()
+        job_id = uuid.uuid4().hex
+        _write_job(job_id, {"status": "queued"})
+        _extract_executor.submit(
+            _run_extract_job, job_id, api_key, pdf_bytes, is_training, training_supplier
+        )
+        location = url_for("extract_status", job_id=job_id)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": location}
+
+    try:
+        return jsonify(_perform_extract(api_key, pdf_bytes, is_training, training_supplier))
     except Exception as exc:
         return jsonify({"error": str(exc)}), 500
 
 
+@app.route("/extract/<job_id>", methods=["GET"])
+def extract_status(job_id):
+    """Poll a background extraction started with POST /extract (async=true)."""
+    record = _read_job(job_id) if _JOB_ID_RE.fullmatch(job_id) else None
+    if record is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if record["status"] in ("queued", "running") and _job_is_stale(job_id):
+        record = {"status": "error", "error": "Extraction was interrupted — please try again"}
+        _write_job(job_id, record)
+    if record["status"] == "error":
+        return jsonify(record), 500
+    if record["status"] != "done":
+        return jsonify(record), 202
+    return jsonify(record)
+
+
 # ─── CEF Purchase Order Extraction ───────────────────────────────────────────
 
 CEF_EXTRACT_PROMPT = """\
@@ -1381,26 +1676,20 @@ def extract_cef():
         return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 500
 
     pdf_bytes = request.files["pdf"].read()
-    b64_pdf = base64.standard_b64encode(pdf_bytes).decode()
-    client = anthropic.Anthropic(api_key=api_key)
+    client = _get_anthropic_client(api_key)
 
     try:
-        resp = client.messages.create(
+        source = _pdf_source(client, pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest())
+        resp = client.beta.messages.create(
             model="claude-opus-4-1",
             max_tokens=1800,
+            betas=[FILES_API_BETA],
             messages=[
                 {
                     "role": "user",
                     "content": [
-                        {
-                            "type": "document",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "application/pdf",
-                                "data": b64_pdf,
-                            },
-                        },
-                        {"type": "text", "text": CEF_EXTRACT_PROMPT},
+                        _cached_text(CEF_EXTRACT_PROMPT),
+                        {"type": "document", "source": source},
                     ],
                 }
             ],
@@ -1543,15 +1832,32 @@ def send_cef_delivery_email():
         return jsonify({"error": f"Failed to send email: {exc}"}), 500
 
 
+# BROKERS only changes on deploy, so the broker endpoints send a strong ETag
+# taken from its contents and let the browser keep the answer for an hour.
+_BROKERS_ETAG = hashlib.blake2b(repr(sorted(BROKERS.items())).encode(), digest_size=8).hexdigest()
+
+
+def _broker_response(payload):
+    """jsonify(payload) with the broker-table ETag, or 304 if the client already has it."""
+    if _BROKERS_ETAG in request.if_none_match:
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(payload)
+    resp.set_etag(_BROKERS_ETAG)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 3600
+    return resp
+
+
 @app.route("/brokers", methods=["GET"])
 def get_brokers():
-    return jsonify({"brokers": [{"name": name, "address": addr} for name, addr in BROKERS.items()]})
+    return _broker_response({"brokers": _BROKER_ROWS})
 
 
 @app.route("/broker-address", methods=["GET"])
 def broker_address():
     name = request.args.get("name", "")
-    return jsonify({"name": name, "address": BROKERS.get(name, "")})
+    return _broker_response({"name": name, "address": BROKERS.get(name, "")})
 
 
 # ─── Supplier template management ─────────────────────────────────────────────
@@ -1613,12 +1919,12 @@ def save_template():
     layout_description = ""
     field_locations = {}
 
-    b64_pdf = TRAINING_PDF_CACHE.pop(supplier, "")
+    source = TRAINING_PDF_CACHE.pop(supplier, None)
     api_key = os.environ.get("ANTHROPIC_API_KEY", "")
 
-    if api_key and b64_pdf:
+    if api_key and source:
         try:
-            client = anthropic.Anthropic(api_key=api_key)
+            client = _get_anthropic_client(api_key)
             layout_prompt = (
                 f"Analyze this PDF from {supplier} and describe the layout "
                 "for future extraction.\n\n"
@@ -1637,20 +1943,14 @@ def save_template():
                 "Be specific about positions (top-left, top-right, center, bottom) "
                 "and nearby labels.\nJSON only. No markdown."
             )
-            layout_resp = client.messages.create(
+            layout_resp = client.beta.messages.create(
                 model="claude-opus-4-1",
                 max_tokens=800,
+                betas=[FILES_API_BETA],
                 messages=[{
                     "role": "user",
                     "content": [
-                        {
-                            "type": "document",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "application/pdf",
-                                "data": b64_pdf,
-                            },
-                        },
+                        {"type": "document", "source": source},
                         {"type": "text", "text": layout_prompt},
                     ],
                 }],
@@ -1716,6 +2016,13 @@ def delete_template(supplier):
 
 MAKE_WEBHOOK_URL = os.environ.get("MAKE_WEBHOOK_URL") or "https://hook.eu1.make.com/79cktukjwpsyscc507c6p1nddb61pydo"
 
+UK_DATE_FMT = "%d/%m/%Y"  # "Date extracted" column in Make.com and Google Sheets
+
+
+def _today_uk():
+    """Today's local date as DD/MM/YYYY, without building a date object."""
+    return time.strftime(UK_DATE_FMT)
+
 
 @app.route("/api/send-to-webhook", methods=["POST"])
 def send_to_webhook():
@@ -1729,7 +2036,7 @@ def send_to_webhook():
         return jsonify({"error": "No PO reference number"}), 400
 
     # Build the 11-field payload
-    date_extracted = date.today().strftime("%d/%m/%Y")
+    date_extracted = _today_uk()
     title_desc = str(data.get("service_description") or "").strip() or "\u2014"
     # Use person details from data if available, otherwise fall back to default
     prepared_by = str(data.get("person_name") or "").strip() or PREPARED_BY["name"]
@@ -1889,7 +2196,7 @@ def save_to_sheets():
             return jsonify({"duplicate": True, "message": "This PO is already in Google Sheets"}), 200
 
         # Build row (11 columns A-K)
-        date_extracted = date.today().strftime("%d/%m/%Y")
+        date_extracted = _today_uk()
         title_desc = str(data.get("service_description") or "").strip() or "\u2014"
         prepared_by = PREPARED_BY["name"]
         customer_company = str(data.get("account_name") or data.get("supplier") or "").strip() or "\u2014"
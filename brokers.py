@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 ACCOUNT_NAMES = [
     "ACM ENVIRONMENTAL PLC",
     "ACUMEN WASTE SERVICES",
@@ -269,5 +271,8 @@ ADDRESS_OVERRIDES = {
     "YES WASTE LIMITED": "Dipford House, Queens Square\nHuddersfield Road, Honley, Holmfirth\nHD9 6QZ",
 }
 
-BROKERS = {name: ADDRESS_OVERRIDES.get(name, "") for name in ACCOUNT_NAMES}
-BROKER_LIST_TEXT = ", ".join(BROKERS.keys())
+# Read-only view: the broker list only changes on deploy, and every request
+# shares this mapping, so nothing at runtime should be able to mutate it.
+BROKERS = MappingProxyType({name: ADDRESS_OVERRIDES.get(name, "") for name in ACCOUNT_NAMES})
+BROKER_NAMES = tuple(BROKERS)
+BROKER_LIST_TEXT = ", ".join(BROKER_NAMES)
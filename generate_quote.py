@@ -9,6 +9,7 @@ Usage:
     python generate_quote.py input.pdf
     python generate_quote.py input.pdf --job-name "Fluorescent Tubes Collection"
     python generate_quote.py input.pdf --out my_quote.pdf
+    python generate_quote.py po1.pdf po2.pdf --batch-api
 
 Requirements:
     pip install anthropic reportlab pillow
@@ -17,47 +18,89 @@ Requirements:
 
 import os
 import sys
+import importlib.util
 import json
 import base64
+import hashlib
+import bisect
+import fnmatch
 import argparse
+import asyncio
+import functools
+import itertools
+import urllib.error
 import urllib.request
 import re
 import io
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 # ─── dependency guard ────────────────────────────────────────────────────────
+# Only checks the packages are installed; anthropic and the ReportLab drawing
+# modules are imported on first use so `--help` doesn't pay for them.
 
-missing = []
+missing = [pkg for pkg in ("anthropic", "reportlab") if importlib.util.find_spec(pkg) is None]
+if missing:
+    sys.exit(f"Missing packages. Run:  pip install {' '.join(missing)}")
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+
+# Optional: orjson parses (and re-serialises) Claude's replies several times faster than json
 try:
-    import anthropic
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
 except ImportError:
-    missing.append("anthropic")
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+# Optional: pyahocorasick finds every broker name in one pass over the text
 try:
-    from reportlab.lib.pagesizes import A4
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# ─── brand colours ───────────────────────────────────────────────────────────
+
+_reportlab_loaded = False
+
+
+def _load_reportlab():
+    """Import the ReportLab drawing modules and build the brand colours (once)."""
+    global _reportlab_loaded, colors, rl_canvas, ImageReader, pdfmetrics, TTFont
+    global NAVY, GREEN, WHITE, LIGHT_ROW, MID_GREY, DARK_GREY, TEXT_GREY
+    global LABEL_GREY, GREEN_LIGHT, BORDER_CLR, BG_BOX, PREP_BG
+    if _reportlab_loaded:
+        return
     from reportlab.lib import colors
-    from reportlab.lib.units import mm
     from reportlab.pdfgen import canvas as rl_canvas
     from reportlab.lib.utils import ImageReader
     from reportlab.pdfbase import pdfmetrics
     from reportlab.pdfbase.ttfonts import TTFont
-except ImportError:
-    missing.append("reportlab")
-if missing:
-    sys.exit(f"Missing packages. Run:  pip install {' '.join(missing)}")
 
-# ─── brand colours ───────────────────────────────────────────────────────────
+    NAVY        = colors.HexColor("#1e2e3d")
+    GREEN       = colors.HexColor("#8ec431")
+    WHITE       = colors.white
+    LIGHT_ROW   = colors.HexColor("#f0f4f8")
+    MID_GREY    = colors.HexColor("#e2e8f0")
+    DARK_GREY   = colors.HexColor("#2d3748")
+    TEXT_GREY   = colors.HexColor("#444444")
+    LABEL_GREY  = colors.HexColor("#718096")
+    GREEN_LIGHT = colors.HexColor("#e8f5d0")
+    BORDER_CLR  = colors.HexColor("#c8d6e5")
+    BG_BOX      = colors.HexColor("#f0f4f8")
+    PREP_BG     = colors.HexColor("#f5f7f9")
+    _reportlab_loaded = True
+
 
-NAVY        = colors.HexColor("#1e2e3d")
-GREEN       = colors.HexColor("#8ec431")
-WHITE       = colors.white
-LIGHT_ROW   = colors.HexColor("#f0f4f8")
-MID_GREY    = colors.HexColor("#e2e8f0")
-DARK_GREY   = colors.HexColor("#2d3748")
-TEXT_GREY   = colors.HexColor("#444444")
-LABEL_GREY  = colors.HexColor("#718096")
-GREEN_LIGHT = colors.HexColor("#e8f5d0")
-BORDER_CLR  = colors.HexColor("#c8d6e5")
-BG_BOX      = colors.HexColor("#f0f4f8")
 BRAND_LOGO_URL = "https://i0.wp.com/wasteexperts.co.uk/wp-content/uploads/2022/11/green-grey-logo-1080.png?w=1920&ssl=1"
 
 # ─── layout ──────────────────────────────────────────────────────────────────
@@ -67,6 +110,18 @@ MARGIN    = 18 * mm
 CONTENT_W = PAGE_W - 2 * MARGIN
 RADIUS    = 2 * mm
 
+# Products & Services table. TABLE_COL_X holds each column's left edge plus
+# the table's right edge; numeric row values sit CELL_PAD inside their column.
+TABLE_COL_W = (CONTENT_W * 0.50, CONTENT_W * 0.11, CONTENT_W * 0.19, CONTENT_W * 0.20)
+TABLE_COL_X = tuple(itertools.accumulate((MARGIN,) + TABLE_COL_W))
+TABLE_HDR_H = 9 * mm
+TABLE_ROW_H = 8 * mm
+CELL_PAD    = 3 * mm
+TEXT_RISE   = 2.5 * mm  # baseline offset from the bottom of a header/row
+SEPARATOR_W = 0.3      # table row separator line width
+
+LINE_LEADING = 4.5 * mm  # baseline to baseline for stacked 9 pt lines (addresses, notes)
+
 # ─── fixed content ───────────────────────────────────────────────────────────
 
 WE_ADDRESS = ["School Lane, Kirkheaton", "Huddersfield, West Yorkshire", "HD5 0JS"]
@@ -79,6 +134,7 @@ PREPARED_BY = {
 }
 
 SCRIPT_DIR = Path(__file__).parent
+CACHE_DIR = Path(os.environ.get("WE_CACHE_DIR") or Path.home() / ".cache" / "waste-experts")
 
 # ─── fonts ───────────────────────────────────────────────────────────────────
 
@@ -96,50 +152,86 @@ FONT_R  = "Montserrat"
 FONT_SB = "Montserrat-SemiBold"
 FONT_B  = "Montserrat-Bold"
 FONT_XB = "Montserrat-ExtraBold"
+_fonts_registered = False
+
+
+def _list_dir(path: Path) -> set:
+    """Names in a directory (empty if it doesn't exist) — one scandir instead of a stat per file."""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
+
+
+def _download_font(fname: str):
+    """Fetch one font file from GitHub into fonts/; returns its path, or the error."""
+    dest = FONT_DIR / fname
+    try:
+        urllib.request.urlretrieve(_GH_BASE + fname, dest)
+        return dest
+    except Exception as exc:
+        return exc
 
 
 def ensure_fonts():
-    """Locate and register Montserrat TTFs with ReportLab.
+    """Locate and register Montserrat TTFs with ReportLab (once per process).
 
     Resolution order for each font file:
       1. fonts/ subdirectory next to this script
-      2. Windows user fonts directory
-      3. Windows system fonts directory
+      2. Windows user fonts directory (Windows only)
+      3. Windows system fonts directory (Windows only)
       4. Download from GitHub (fallback, may fail)
     Falls back to Helvetica if none of the above succeed.
     """
-    global FONT_R, FONT_SB, FONT_B, FONT_XB
+    global FONT_R, FONT_SB, FONT_B, FONT_XB, _fonts_registered
+    if _fonts_registered:
+        return
+    _load_reportlab()
+    _fonts_registered = True
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    if all(face in registered for face, _ in FONT_SPECS):
+        return
     FONT_DIR.mkdir(exist_ok=True)
 
     # Extra search dirs (Windows font locations)
-    _win_user = Path.home() / "AppData/Local/Microsoft/Windows/Fonts"
-    _win_sys  = Path("C:/Windows/Fonts")
-    _search   = [FONT_DIR, _win_user, _win_sys]
-
-    all_ok = True
+    search_dirs = [FONT_DIR]
+    if sys.platform == "win32":
+        search_dirs.append(Path.home() / "AppData/Local/Microsoft/Windows/Fonts")
+        search_dirs.append(Path("C:/Windows/Fonts"))
+    _search = [(d, _list_dir(d)) for d in search_dirs]
+
+    # 1. Find each file in one of the known locations, copying it to fonts/
+    #    so ReportLab always loads from a stable path
+    located = {}
     for face, fname in FONT_SPECS:
-        # 1. Find the file in one of the known locations
-        found = next((d / fname for d in _search if (d / fname).exists()), None)
-
-        # 2. Copy to fonts/ so ReportLab always loads from a stable path
+        if face in registered:
+            continue
+        found = next((d / fname for d, names in _search if fname in names), None)
         dest = FONT_DIR / fname
         if found and found != dest:
-            import shutil as _shutil
-            _shutil.copy2(found, dest)
+            shutil.copy2(found, dest)
             found = dest
+        located[face] = found
 
-        # 3. Download as last resort
-        if not found:
-            url = _GH_BASE + fname
+    # 2. Download whatever is still missing, all faces at once
+    all_ok = True
+    to_fetch = [(face, fname) for face, fname in FONT_SPECS if face in located and not located[face]]
+    if to_fetch:
+        for _, fname in to_fetch:
             print(f"  Downloading {fname}...")
-            try:
-                urllib.request.urlretrieve(url, dest)
-                found = dest
-            except Exception as exc:
-                print(f"  [!] Could not obtain {fname}: {exc}")
-                all_ok = False
-                continue
-
+        with ThreadPoolExecutor(max_workers=len(to_fetch)) as pool:
+            fetched = pool.map(_download_font, [fname for _, fname in to_fetch])
+            for (face, fname), result in zip(to_fetch, fetched):
+                if isinstance(result, Exception):
+                    print(f"  [!] Could not obtain {fname}: {result}")
+                    all_ok = False
+                    del located[face]
+                else:
+                    located[face] = result
+
+    # 3. Register serially — pdfmetrics' registry isn't thread-safe
+    for face, found in located.items():
         try:
             pdfmetrics.registerFont(TTFont(face, str(found)))
         except Exception as exc:
@@ -343,15 +435,33 @@ BROKER_LIST = [
     "Yes Waste Limited",
 ]
 
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
+
 # Pre-compute normalised keys for fast matching
 def _normalise(text: str) -> str:
     """Lowercase, collapse whitespace, strip punctuation for fuzzy matching."""
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    return re.sub(r"\s+", " ", text).strip()
+    # split()/join collapses and trims whitespace in one C pass, faster than a second regex
+    return " ".join(_NON_ALNUM_RE.sub(" ", text.lower()).split())
 
 _BROKER_NORMALISED = [(_normalise(b), b) for b in BROKER_LIST]
 
+# Longest-match first — prevents 'Suez' matching before 'Suez Recycling and Recovery UK Ltd'.
+# Names under 4 chars are left out to avoid false positives.
+_BROKER_KEYS = [
+    (norm_broker, canonical)
+    for norm_broker, canonical in sorted(_BROKER_NORMALISED, key=lambda x: len(x[0]), reverse=True)
+    if len(norm_broker) >= 4
+]
+
+_BROKER_AUTOMATON = None
+if ahocorasick is not None:
+    _BROKER_AUTOMATON = ahocorasick.Automaton()
+    for rank, (norm_broker, canonical) in enumerate(_BROKER_KEYS):
+        if norm_broker not in _BROKER_AUTOMATON:
+            _BROKER_AUTOMATON.add_word(norm_broker, (rank, canonical))
+    _BROKER_AUTOMATON.make_automaton()
+
 
 def _extract_pdf_text(pdf_path: Path) -> str:
     """Extract raw text from PDF using pypdf if available, else return empty string."""
@@ -380,32 +490,44 @@ def match_broker_in_text(raw_text: str) -> str | None:
     """
     normalised_doc = _normalise(raw_text)
 
-    # Longest-match first — prevents 'Suez' matching before 'Suez Recycling and Recovery UK Ltd'
-    sorted_brokers = sorted(_BROKER_NORMALISED, key=lambda x: len(x[0]), reverse=True)
+    if _BROKER_AUTOMATON is not None:
+        # Every hit in one pass; the lowest rank is the one the loop below would find first
+        best = min((hit for _, hit in _BROKER_AUTOMATON.iter(normalised_doc)), default=None)
+        return best[1] if best else None
 
-    for norm_broker, canonical in sorted_brokers:
-        if len(norm_broker) < 4:
-            continue  # too short — skip to avoid false positives
+    for norm_broker, canonical in _BROKER_KEYS:
         if norm_broker in normalised_doc:
             return canonical
 
     return None
 
 
+# One alternation scanned in a single pass instead of a substring test per pattern
+_INVALID_SUPPLIER_RE = re.compile("|".join(map(re.escape, INVALID_BILL_TO_PATTERNS)))
+
+
+@functools.lru_cache(maxsize=1024)  # the same names recur across a batch of POs
 def _is_invalid_supplier(name: str) -> bool:
     normalized = (name or "").strip().lower()
-    return any(pat in normalized for pat in INVALID_BILL_TO_PATTERNS)
+    return _INVALID_SUPPLIER_RE.search(normalized) is not None
+
+
+# Compiled once — these run over every PO's terms/footer text
+_COMPANY_RE = re.compile(
+    r"\b([A-Z][A-Za-z&'.,-]*(?:\s+[A-Z][A-Za-z&'.,-]*){0,5}\s+(?:Ltd|Limited|PLC|LLP))\b"
+)
+_REG_OFFICE_RE = re.compile(
+    r"Registered Office:\s*(.+?)(?:Registered in|Company Number|$)",
+    flags=re.I | re.S,
+)
 
 
 def _extract_company_candidates(text: str) -> list:
     """Find likely UK company names from free text (e.g. footer terms)."""
     if not text:
         return []
-    pattern = re.compile(
-        r"\b([A-Z][A-Za-z&'.,-]*(?:\s+[A-Z][A-Za-z&'.,-]*){0,5}\s+(?:Ltd|Limited|PLC|LLP))\b"
-    )
     seen, names = set(), []
-    for match in pattern.findall(text):
+    for match in _COMPANY_RE.findall(text):
         name = " ".join(match.replace("\n", " ").split()).strip(" ,.-")
         key = name.lower()
         if key not in seen and not _is_invalid_supplier(name):
@@ -418,11 +540,7 @@ def _extract_registered_office(text: str) -> str:
     """Try to pull a Registered Office address block from free text."""
     if not text:
         return ""
-    m = re.search(
-        r"Registered Office:\s*(.+?)(?:Registered in|Company Number|$)",
-        text,
-        flags=re.I | re.S,
-    )
+    m = _REG_OFFICE_RE.search(text)
     if not m:
         return ""
     return " ".join(m.group(1).replace("\n", " ").split()).strip(" ,")
@@ -460,6 +578,9 @@ HAZARDOUS_KEYWORDS = {
     "lithium", "nicad", "nickel cadmium", "battery", "ionisation", "smoke detector",
 }
 
+# Any keyword anywhere in the text — one scan rather than a substring test per keyword
+_HAZARD_RE = re.compile("|".join(map(re.escape, sorted(HAZARDOUS_KEYWORDS))))
+
 
 def is_hazardous(data: dict) -> bool:
     """Return True if the job involves hazardous waste.
@@ -481,7 +602,7 @@ def is_hazardous(data: dict) -> bool:
         texts.append(item.get("description") or "")
 
     combined = " ".join(texts).lower()
-    return any(kw in combined for kw in HAZARDOUS_KEYWORDS)
+    return _HAZARD_RE.search(combined) is not None
 
 
 def inject_note_charge(data: dict) -> dict:
@@ -516,43 +637,196 @@ def inject_note_charge(data: dict) -> dict:
     return data
 
 
-def extract(pdf_path: Path) -> dict:
+def _api_key() -> str:
     api_key = os.environ.get("ANTHROPIC_API_KEY", "")
     if not api_key:
         sys.exit("Error: ANTHROPIC_API_KEY environment variable is not set.")
+    return api_key
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """The process's one Anthropic client, so its connection pool stays warm between calls."""
+    import anthropic
+
+    return anthropic.Anthropic(api_key=_api_key())
+
+
+FILES_API_BETA = "files-api-2025-04-14"
+
+B64_CHUNK = 57 * 16384  # multiple of 3, so chunks encode without padding
+
+
+def _b64_file(path: Path) -> str:
+    """Base64-encode a file chunk by chunk into one preallocated buffer.
+
+    Only a chunk of the raw file is resident at a time, instead of the whole
+    file alongside its encoding.
+    """
+    size = path.stat().st_size
+    out = bytearray(4 * ((size + 2) // 3))
+    pos = 0
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(B64_CHUNK), b""):
+            enc = base64.b64encode(chunk)
+            out[pos:pos + len(enc)] = enc
+            pos += len(enc)
+    del out[pos:]  # in case the file shrank after stat()
+    return out.decode("ascii")
+
+
+# sha256 of PDF bytes -> Files API id. A document already uploaded in this run
+# (a duplicate input, or a request being retried) is referenced, not re-sent.
+# The extract functions delete their uploads when they finish, so POs don't
+# pile up in the organisation's file storage.
+_FILE_IDS = {}
+# sha256 -> asyncio.Lock, so concurrent tasks given the same PDF upload it once
+_UPLOAD_LOCKS = {}
+
+
+def _upload_pdf(client, pdf_path: Path) -> dict:
+    """Upload a PDF through the Files API and return a document source for it.
+
+    The request then carries a short file_id instead of the base64 document
+    (a third larger than the file, and held in memory several times over).
+    If the upload fails the PDF is sent inline as before.
+    """
+    import anthropic
 
-    client = anthropic.Anthropic(api_key=api_key)
     pdf_bytes = pdf_path.read_bytes()
-    b64 = base64.standard_b64encode(pdf_bytes).decode()
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    if digest not in _FILE_IDS:
+        try:
+            uploaded = client.beta.files.upload(file=(pdf_path.name, pdf_bytes, "application/pdf"))
+        except anthropic.APIError as exc:
+            return _inline_source(pdf_path, exc)
+        _FILE_IDS[digest] = uploaded.id
+    return {"type": "file", "file_id": _FILE_IDS[digest]}
+
 
-    resp = client.messages.create(
-        model="claude-opus-4-6",
-        max_tokens=2000,
-        messages=[
+def _take_uploads() -> list:
+    """File ids uploaded so far, forgotten so they are deleted only once."""
+    file_ids = list(_FILE_IDS.values())
+    _FILE_IDS.clear()
+    _UPLOAD_LOCKS.clear()  # bound to the event loop that is finishing
+    return file_ids
+
+
+def _delete_uploads(client) -> None:
+    """Delete the uploaded POs from the Files API; a failure is only reported."""
+    import anthropic
+
+    for file_id in _take_uploads():
+        try:
+            client.beta.files.delete(file_id)
+        except anthropic.APIError as exc:
+            print(f"  [!] Could not delete uploaded file {file_id}: {exc}")
+
+
+def _inline_source(pdf_path: Path, upload_error) -> dict:
+    """Base64 document source, used when the Files API upload failed."""
+    print(f"  [!] Files API upload failed for {pdf_path.name} ({upload_error}) — sending inline")
+    return {
+        "type": "base64",
+        "media_type": "application/pdf",
+        "data": _b64_file(pdf_path),
+    }
+
+
+# A single PO's JSON is well under 1000 tokens, but a long verbatim terms block
+# can run past it; a reply cut off at the ceiling is re-requested with
+# MAX_TOKENS_RETRY_FACTOR times the room rather than reserving that on every call.
+EXTRACT_MAX_TOKENS = 1000
+MAX_TOKENS_RETRY_FACTOR = 4
+
+
+def _extract_request(source: dict) -> dict:
+    """Build the messages.create parameters for one purchase order document source."""
+    return {
+        "model": "claude-opus-4-6",
+        "max_tokens": EXTRACT_MAX_TOKENS,
+        "betas": [FILES_API_BETA],
+        "messages": [
             {
                 "role": "user",
                 "content": [
+                    # Static instructions first: the cache breakpoint covers the
+                    # prefix up to here, so every PO after the first reads the
+                    # prompt from Anthropic's cache. The PDF stays uncached.
                     {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": b64,
-                        },
+                        "type": "text",
+                        "text": EXTRACT_PROMPT,
+                        "cache_control": {"type": "ephemeral"},
                     },
-                    {"type": "text", "text": EXTRACT_PROMPT},
+                    {"type": "document", "source": source},
                 ],
             }
         ],
-    )
+    }
+
+
+# ─── reply cache ─────────────────────────────────────────────────────────────
+# Claude's JSON for each PO is kept in CACHE_DIR by PDF content hash, so a PO
+# that is run again (a rerun, a retry, the same PO sent twice) skips the
+# request. The prompt is part of the key: editing EXTRACT_PROMPT starts afresh.
 
-    raw = resp.content[0].text.strip()
-    if "```" in raw:
-        start = raw.find("{")
-        end = raw.rfind("}") + 1
-        raw = raw[start:end]
+REPLY_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds
+_PROMPT_KEY = hashlib.blake2b(EXTRACT_PROMPT.encode(), digest_size=32).digest()
 
-    parsed = json.loads(raw)
+
+def _reply_cache_path(pdf_path: Path) -> Path:
+    digest = hashlib.blake2b(pdf_path.read_bytes(), digest_size=16, key=_PROMPT_KEY).hexdigest()
+    return CACHE_DIR / "replies" / f"{digest}.json"
+
+
+def _cached_reply(pdf_path: Path) -> str | None:
+    """Claude's stored JSON for this PO, or None if there is none or it has expired."""
+    try:
+        cache = _reply_cache_path(pdf_path)
+        if time.time() - cache.stat().st_mtime < REPLY_CACHE_MAX_AGE:
+            return cache.read_text(encoding="utf-8")
+    except OSError:
+        pass
+    return None
+
+
+def _store_reply(pdf_path: Path, raw: str) -> None:
+    try:
+        cache = _reply_cache_path(pdf_path)
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(raw, encoding="utf-8")
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+
+
+def extract_cached(pdf_paths: list) -> dict:
+    """{pdf_path: data} for the POs that have a stored reply; the rest are left out."""
+    results = {}
+    for pdf_path in pdf_paths:
+        raw = _cached_reply(pdf_path)
+        if raw is not None:
+            print(f"Using stored extraction for {pdf_path.name}")
+            results[pdf_path] = _finish_extraction(raw, pdf_path, store=False)
+    return results
+
+
+# Outermost {...} in the reply, whether or not Claude wrapped it in ``` fences
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def _finish_extraction(raw: str, pdf_path: Path = None, store: bool = True) -> dict:
+    """Parse Claude's JSON reply, then apply broker matching and the note charge.
+
+    A reply that parses is stored in the reply cache unless store is False.
+    """
+    m = _JSON_OBJECT_RE.search(raw)
+    raw = m.group(0) if m else raw.strip()
+
+    parsed = _json_loads(raw)
+    if store and pdf_path is not None:
+        _store_reply(pdf_path, raw)
     data = normalize_extracted_data(parsed)
 
     # ── DEBUG ─────────────────────────────────────────────────────────────────
@@ -581,28 +855,399 @@ def extract(pdf_path: Path) -> dict:
     return inject_note_charge(data)
 
 
+def _more_tokens(params: dict, what: str) -> dict:
+    """params with a MAX_TOKENS_RETRY_FACTOR times higher ceiling, after a truncated reply."""
+    more = params["max_tokens"] * MAX_TOKENS_RETRY_FACTOR
+    print(f"  [!] {what}: reply hit max_tokens={params['max_tokens']}, retrying with {more}")
+    return dict(params, max_tokens=more)
+
+
+class _ObjectEnd:
+    """Finds where the first top-level {...} in streamed text closes.
+
+    Braces inside JSON strings are skipped, so a '}' in the notes doesn't end
+    the object early.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.seen = 0
+
+    def feed(self, chunk: str):
+        """Offset just past the closing brace in all text fed so far, or None."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.depth > 0
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    return self.seen + i + 1
+        self.seen += len(chunk)
+        return None
+
+
+def _log_cache_usage(what: str, usage) -> None:
+    """Show how much of the prompt came from Anthropic's prompt cache."""
+    read = getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    print(f"  [debug] {what}: prompt cache read {read}, written {written} tokens")
+
+
+def _stream_reply(client, params: dict, what: str) -> tuple:
+    """Stream a reply and stop reading as soon as its JSON object is complete.
+
+    Returns (text, stop_reason). Leaving the stream early closes the response,
+    so trailing fences or commentary are never generated or waited for.
+    """
+    scanner = _ObjectEnd()
+    parts = []
+    with client.beta.messages.stream(**params) as stream:
+        for text in stream.text_stream:
+            if not parts:
+                _log_cache_usage(what, stream.current_message_snapshot.usage)
+            parts.append(text)
+            end = scanner.feed(text)
+            if end is not None:
+                return "".join(parts)[:end], "end_turn"
+        return "".join(parts), stream.get_final_message().stop_reason
+
+
+def _extract_raw(client, pdf_path: Path) -> str:
+    """Send one PO to Claude and return the raw reply text."""
+    params = _extract_request(_upload_pdf(client, pdf_path))
+    raw, stop_reason = _stream_reply(client, params, pdf_path.name)
+    if stop_reason == "max_tokens":
+        raw, _ = _stream_reply(client, _more_tokens(params, pdf_path.name), pdf_path.name)
+    return raw
+
+
+def extract(pdf_path: Path) -> dict:
+    client = _get_client()
+    try:
+        raw = _extract_raw(client, pdf_path)
+    finally:
+        _delete_uploads(client)
+    return _finish_extraction(raw, pdf_path)
+
+
+# Claude requests in flight, and the minimum gap between request starts, when
+# several POs are given. Lower them for an account with a small rate limit.
+EXTRACT_CONCURRENCY = int(os.environ.get("ANTHROPIC_MAX_CONCURRENCY") or 8)
+MIN_REQUEST_INTERVAL = int(os.environ.get("ANTHROPIC_MIN_INTERVAL_MS") or 150) / 1000
+RATE_LIMIT_RETRIES = 3   # extra 429/5xx retries once the SDK's own retries run out
+RETRY_BACKOFF_CAP = 30   # seconds
+PDF_WORKERS = min(os.cpu_count() or 1, 4)  # processes rendering PDFs
+
+
+def _retry_after(exc, attempt: int) -> float:
+    """Seconds to wait before a retry: the server's retry-after, else 1, 2, 4 ... plus jitter."""
+    try:
+        return float(exc.response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return min(2 ** attempt, RETRY_BACKOFF_CAP) * random.uniform(1, 1.5)
+
+
+class _RequestGate:
+    """Concurrency cap and start-time spacing shared by one run's Claude requests.
+
+    `async with gate:` holds one of EXTRACT_CONCURRENCY slots for a PO's
+    upload and request; `await gate.pace()` before each request keeps
+    starts at least MIN_REQUEST_INTERVAL apart, so a burst of POs ramps up
+    instead of landing on the rate limiter all at once.
+    """
+
+    def __init__(self, max_concurrency: int = EXTRACT_CONCURRENCY, interval: float = MIN_REQUEST_INTERVAL):
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._interval = interval
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._sem.release()
+
+    async def pace(self):
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def _upload_pdf_async(client, pdf_path: Path) -> dict:
+    """Async version of _upload_pdf.
+
+    Tasks holding the same bytes (one PO under two paths) wait on a per-digest
+    lock, so the second reuses the first's upload instead of replacing its id.
+    """
+    import anthropic
+
+    pdf_bytes = pdf_path.read_bytes()
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    async with _UPLOAD_LOCKS.setdefault(digest, asyncio.Lock()):
+        if digest not in _FILE_IDS:
+            try:
+                uploaded = await client.beta.files.upload(
+                    file=(pdf_path.name, pdf_bytes, "application/pdf")
+                )
+            except anthropic.APIError as exc:
+                return _inline_source(pdf_path, exc)
+            _FILE_IDS[digest] = uploaded.id
+    return {"type": "file", "file_id": _FILE_IDS[digest]}
+
+
+async def _delete_uploads_async(client) -> None:
+    """Async version of _delete_uploads, deleting the files concurrently."""
+    import anthropic
+
+    file_ids = _take_uploads()
+    outcomes = await asyncio.gather(
+        *(client.beta.files.delete(file_id) for file_id in file_ids),
+        return_exceptions=True,
+    )
+    for file_id, outcome in zip(file_ids, outcomes):
+        if isinstance(outcome, anthropic.APIError):
+            print(f"  [!] Could not delete uploaded file {file_id}: {outcome}")
+
+
+async def _create_async(client, gate: _RequestGate, params: dict, what: str) -> str:
+    """Send one messages request, retrying 429s, 5xx and truncated replies, and return the raw reply text."""
+    import anthropic
+
+    ceiling = params["max_tokens"] * MAX_TOKENS_RETRY_FACTOR
+    for attempt in itertools.count():
+        await gate.pace()
+        try:
+            resp = await client.beta.messages.create(**params)
+        except (anthropic.RateLimitError, anthropic.InternalServerError) as exc:
+            if attempt >= RATE_LIMIT_RETRIES:
+                raise
+            delay = _retry_after(exc, attempt)
+            reason = "rate limited" if isinstance(exc, anthropic.RateLimitError) else f"HTTP {exc.status_code}"
+            print(f"  [!] {what}: {reason}, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            continue
+        _log_cache_usage(what, resp.usage)
+        if resp.stop_reason == "max_tokens" and params["max_tokens"] < ceiling:
+            params = _more_tokens(params, what)
+            continue
+        return resp.content[0].text
+
+
+async def _extract_raw_async(client, gate: _RequestGate, pdf_path: Path) -> str:
+    """Async version of _extract_raw, holding one slot of gate for its requests."""
+    async with gate:
+        source = await _upload_pdf_async(client, pdf_path)
+        return await _create_async(client, gate, _extract_request(source), pdf_path.name)
+
+
+async def _extract_raw_all(pdf_paths: list) -> list:
+    """Claude replies (or their exceptions), in input order."""
+    import anthropic
+
+    gate = _RequestGate()
+    async with anthropic.AsyncAnthropic(api_key=_api_key()) as client:
+        try:
+            return await asyncio.gather(
+                *(_extract_raw_async(client, gate, p) for p in pdf_paths),
+                return_exceptions=True,
+            )
+        finally:
+            await _delete_uploads_async(client)
+
+
+def extract_many(pdf_paths: list) -> dict:
+    """Extract several POs with overlapping Claude requests.
+
+    Up to EXTRACT_CONCURRENCY requests share one AsyncAnthropic client; the
+    replies are then parsed and broker-matched in input order so each PO's
+    log lines stay together. Returns {pdf_path: data}, with data=None for a
+    PO that couldn't be read or whose request or reply failed.
+    """
+    import anthropic
+
+    replies = asyncio.run(_extract_raw_all(pdf_paths))
+    results = {}
+    for pdf_path, raw in zip(pdf_paths, replies):
+        print(f"Parsing {pdf_path.name}")
+        try:
+            if isinstance(raw, BaseException):
+                raise raw
+            results[pdf_path] = _finish_extraction(raw, pdf_path)
+        except (anthropic.APIError, ValueError, OSError) as exc:
+            print(f"  [!] Extraction failed: {exc}")
+            results[pdf_path] = None
+    return results
+
+
+# ─── grouped extraction ──────────────────────────────────────────────────────
+# Several POs in one request: the prompt and the round trip are paid once per
+# group instead of once per PO, at the cost of a longer reply.
+
+GROUP_SIZE = 4  # POs per request with --group
+
+GROUP_PROMPT = """The {n} documents above are separate purchase orders. Apply the instructions to each one independently.
+Return ONLY a JSON array of exactly {n} objects, one per document, in document order — no markdown, no explanation."""
+
+# Outermost [...] in the reply, whether or not Claude wrapped it in ``` fences
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.S)
+
+
+def _group_request(sources: list) -> dict:
+    """messages.create parameters extracting several PO document sources at once."""
+    params = _extract_request(sources[0])
+    if len(sources) == 1:
+        return params
+    content = params["messages"][0]["content"][:1]  # the cached EXTRACT_PROMPT block
+    for i, source in enumerate(sources, 1):
+        content.append({"type": "text", "text": f"Document {i}:"})
+        content.append({"type": "document", "source": source})
+    content.append({"type": "text", "text": GROUP_PROMPT.format(n=len(sources))})
+    params["messages"][0]["content"] = content
+    params["max_tokens"] *= len(sources)
+    return params
+
+
+def _split_group_reply(raw: str, n: int) -> list:
+    """Split a grouped reply into one JSON string per PO, or raise ValueError."""
+    if n == 1:
+        return [raw]  # a group of one is an ordinary single-PO request
+    m = _JSON_ARRAY_RE.search(raw)
+    items = _json_loads(m.group(0) if m else raw.strip())
+    if not isinstance(items, list) or len(items) != n or not all(isinstance(i, dict) for i in items):
+        raise ValueError(f"expected a JSON array of {n} objects")
+    return [_json_dumps(item) for item in items]
+
+
+async def _extract_group_async(client, gate: _RequestGate, group: list) -> str:
+    async with gate:
+        sources = [await _upload_pdf_async(client, p) for p in group]
+        return await _create_async(client, gate, _group_request(sources), f"{len(group)}-PO group")
+
+
+async def _extract_groups_all(groups: list) -> list:
+    """Claude replies (or their exceptions) per group."""
+    import anthropic
+
+    gate = _RequestGate()
+    async with anthropic.AsyncAnthropic(api_key=_api_key()) as client:
+        try:
+            return await asyncio.gather(
+                *(_extract_group_async(client, gate, g) for g in groups),
+                return_exceptions=True,
+            )
+        finally:
+            await _delete_uploads_async(client)
+
+
+def extract_grouped(pdf_paths: list, group_size: int = GROUP_SIZE) -> dict:
+    """Extract POs group_size at a time, one Claude request per group.
+
+    POs are grouped by file size, as a rough proxy for page count, so a long
+    PO doesn't hold up several short ones. A group whose reply doesn't split
+    into one object per PO is retried one PO per request. Returns the same
+    {pdf_path: data or None} as extract_many.
+    """
+    import anthropic
+
+    by_size = sorted(pdf_paths, key=lambda p: p.stat().st_size)
+    groups = [by_size[i:i + group_size] for i in range(0, len(by_size), group_size)]
+    replies = asyncio.run(_extract_groups_all(groups))
+
+    results, retry = {}, []
+    for group, raw in zip(groups, replies):
+        try:
+            if isinstance(raw, BaseException):
+                raise raw
+            items = _split_group_reply(raw, len(group))
+        except (anthropic.APIError, ValueError, OSError) as exc:
+            print(f"  [!] Group of {len(group)} failed ({exc}) — retrying one PO per request")
+            retry.extend(group)
+            continue
+        for pdf_path, item in zip(group, items):
+            print(f"Parsing {pdf_path.name}")
+            results[pdf_path] = _finish_extraction(item, pdf_path)
+    if retry:
+        results.update(extract_many(retry))
+    return {p: results[p] for p in pdf_paths}
+
+
+# Batch status polling backs off exponentially: quick turnarounds are picked
+# up within seconds, long-running batches are polled at most once a minute.
+BATCH_POLL_MIN_SECONDS = 1
+BATCH_POLL_MAX_SECONDS = 60
+
+
+def extract_batch(pdf_paths: list) -> dict:
+    """Extract several POs in one Message Batches API submission.
+
+    Batched requests cost half as much as extract() but are processed
+    asynchronously (usually minutes, at most 24 hours), so this suits
+    backfills rather than a quote someone is waiting for. Returns
+    {pdf_path: data} in input order for every PO that succeeded.
+    """
+    client = _get_client()
+    # custom_id must match [a-zA-Z0-9_-]{1,64}, so file names can't be used directly
+    by_id = {f"po-{i}": pdf_path for i, pdf_path in enumerate(pdf_paths)}
+    try:
+        requests = []
+        for custom_id, pdf_path in by_id.items():
+            params = _extract_request(_upload_pdf(client, pdf_path))
+            del params["betas"]  # batch-level header, not a per-request parameter
+            # No cheap retry for a truncated batch reply, and latency doesn't matter here
+            params["max_tokens"] *= MAX_TOKENS_RETRY_FACTOR
+            requests.append({"custom_id": custom_id, "params": params})
+        batch = client.beta.messages.batches.create(requests=requests, betas=[FILES_API_BETA])
+        print(f"  Submitted batch {batch.id} ({len(by_id)} POs)")
+
+        delay = BATCH_POLL_MIN_SECONDS
+        while batch.processing_status != "ended":
+            time.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX_SECONDS)
+            batch = client.beta.messages.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"  ... {counts.processing} processing, {counts.succeeded} succeeded, {counts.errored} errored")
+        entries = list(client.beta.messages.batches.results(batch.id))
+    finally:
+        _delete_uploads(client)
+
+    results = {}
+    for entry in entries:
+        pdf_path = by_id[entry.custom_id]
+        if entry.result.type != "succeeded":
+            print(f"  [!] {pdf_path.name}: batch request {entry.result.type}")
+            continue
+        print(f"Parsing {pdf_path.name}")
+        try:
+            results[pdf_path] = _finish_extraction(entry.result.message.content[0].text, pdf_path)
+        except ValueError as exc:
+            print(f"  [!] {pdf_path.name}: could not parse Claude's reply: {exc}")
+    return {p: results[p] for p in pdf_paths if p in results}
+
+
 # ─── drawing helpers ─────────────────────────────────────────────────────────
 
 def rounded_rect(c, x, y, w, h, r=RADIUS, fill=None, stroke=None, lw=0.5):
     """Draw a rounded-corner rectangle. y = BOTTOM of rect (ReportLab coords)."""
-    k = r * 0.5523  # Bezier control-point offset for quarter-circle approximation
-    p = c.beginPath()
-    p.moveTo(x + r, y)
-    p.lineTo(x + w - r, y)
-    p.curveTo(x + w - k, y,      x + w, y + k,      x + w, y + r)
-    p.lineTo(x + w, y + h - r)
-    p.curveTo(x + w, y + h - k,  x + w - k, y + h,  x + w - r, y + h)
-    p.lineTo(x + r, y + h)
-    p.curveTo(x + k, y + h,      x, y + h - k,       x, y + h - r)
-    p.lineTo(x, y + r)
-    p.curveTo(x, y + k,           x + k, y,           x + r, y)
-    p.close()
     if fill is not None:
         c.setFillColor(fill)
     if stroke is not None:
         c.setStrokeColor(stroke)
         c.setLineWidth(lw)
-    c.drawPath(p, fill=int(fill is not None), stroke=int(stroke is not None))
+    c.roundRect(x, y, w, h, r, stroke=int(stroke is not None), fill=int(fill is not None))
 
 
 def money(val) -> str:
@@ -612,33 +1257,85 @@ def money(val) -> str:
         return "£0.00"
 
 
+# ─── text measurement ────────────────────────────────────────────────────────
+# pdfmetrics.stringWidth walks the font metrics on every call, and the wrap /
+# shrink / truncate loops would call it once per trial prefix. Glyph advances
+# are cached per font in 1/1000 em, so a width is a sum of dict lookups and a
+# cut point is a bisect over cumulative advances.
+
+_GLYPH_WIDTHS = {}  # font name -> {char: advance in 1/1000 em}
+
+
+def _char_advances(text: str, font: str) -> list:
+    """Advance of each character in text, in 1/1000 em."""
+    widths = _GLYPH_WIDTHS.setdefault(font, {})
+    advances = []
+    for ch in text:
+        w = widths.get(ch)
+        if w is None:
+            w = widths[ch] = pdfmetrics.stringWidth(ch, font, 1000)
+        advances.append(w)
+    return advances
+
+
+def text_width(text: str, font: str, size: float) -> float:
+    """Same result as pdfmetrics.stringWidth, from the cached glyph table."""
+    return sum(_char_advances(text, font)) * size / 1000.0
+
+
+_MAX_ASCII_ADVANCE = {}  # font name -> widest printable ASCII glyph, 1/1000 em
+
+
+def _fits_by_length(text: str, font: str, size: float, max_width: float) -> bool:
+    """True when text is ASCII and short enough that even a run of the font's
+    widest ASCII glyph would fit, so no per-character measuring is needed."""
+    if not text.isascii():
+        return False
+    widest = _MAX_ASCII_ADVANCE.get(font)
+    if widest is None:
+        widest = _MAX_ASCII_ADVANCE[font] = max(_char_advances(
+            "".join(map(chr, range(32, 127))), font))
+    return len(text) * widest * size <= max_width * 1000.0
+
+
+def _fit_prefix(text: str, font: str, size: float, max_width: float) -> int:
+    """Length of the longest prefix of text no wider than max_width."""
+    cumulative = list(itertools.accumulate(_char_advances(text, font)))
+    return bisect.bisect_right(cumulative, max_width * 1000.0 / size)
+
+
 def wrap_text(c, text, font, size, max_width) -> list:
-    """Split text into lines that each fit within max_width, including long words."""
+    """Split text into lines that each fit within max_width, including long words.
+
+    Widths are kept as running totals in 1/1000 em, so each character is
+    measured once rather than every time its line is re-measured.
+    """
+    limit = max_width * 1000.0 / size
+    space = text_width(" ", font, 1000)
+
     def split_long_token(token):
-        chunks = []
-        remaining = token
-        while remaining and c.stringWidth(remaining, font, size) > max_width:
-            cut = len(remaining)
-            while cut > 1 and c.stringWidth(remaining[:cut], font, size) > max_width:
-                cut -= 1
-            chunks.append(remaining[:cut])
-            remaining = remaining[cut:]
-        if remaining:
-            chunks.append(remaining)
-        return chunks or [""]
-
-    words = (text or "").split()
-    lines, line = [], ""
-    for word in words:
-        pieces = split_long_token(word)
-        for piece in pieces:
-            candidate = (line + " " + piece).strip()
-            if c.stringWidth(candidate, font, size) <= max_width:
-                line = candidate
+        """(piece, width) chunks of token, each no wider than max_width where possible."""
+        cumulative = list(itertools.accumulate(_char_advances(token, font)))
+        chunks, start, base = [], 0, 0.0
+        while start < len(token) and cumulative[-1] - base > limit:
+            cut = max(start + 1, bisect.bisect_right(cumulative, base + limit))
+            chunks.append((token[start:cut], cumulative[cut - 1] - base))
+            start, base = cut, cumulative[cut - 1]
+        if start < len(token):
+            chunks.append((token[start:], cumulative[-1] - base))
+        return chunks
+
+    lines, line, line_w = [], "", 0.0
+    for word in (text or "").split():
+        for piece, piece_w in split_long_token(word):
+            if not line:
+                line, line_w = piece, piece_w
+            elif line_w + space + piece_w <= limit:
+                line += " " + piece
+                line_w += space + piece_w
             else:
-                if line:
-                    lines.append(line)
-                line = piece
+                lines.append(line)
+                line, line_w = piece, piece_w
     if line:
         lines.append(line)
     return lines or [""]
@@ -653,10 +1350,195 @@ def label(c, x, y, text):
 
 # ─── PDF generation ──────────────────────────────────────────────────────────
 
+# Decoded logos, shared by every quote rendered in this process. Keyed by the
+# resolved local path or by BRAND_LOGO_URL (False = remote fetch failed).
+_LOGO_CACHE = {}
+
+LOGO_CACHE_WIDTH = 600  # px; the logo is never drawn wider than ~60 mm
+
+
+LOGO_PATTERNS = ("WhatsApp_Image_*.jpeg", "WhatsApp_Image_*.jpg", "logo.png", "logo.jpg")
+
+
+@functools.lru_cache(maxsize=1)
+def _find_logo() -> Path:
+    """Logo next to the script: the WhatsApp image first, then generic names.
+
+    One directory listing matched against every pattern, instead of a glob each.
+    """
+    names = sorted(_list_dir(SCRIPT_DIR))
+    for pattern in LOGO_PATTERNS:
+        for name in names:
+            if fnmatch.fnmatchcase(name, pattern):
+                return SCRIPT_DIR / name
+    return SCRIPT_DIR / "logo.png"
+
+
+def _logo_mode(im) -> str:
+    """RGBA for images with an alpha channel or a transparent colour, else RGB."""
+    return "RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB"
+
+
+def _get_cached_logo(src: Path) -> Path:
+    """Return a downscaled PNG copy of the logo, rebuilt when src changes.
+
+    Saves PIL decoding a large (often colour-profiled) JPEG on every quote.
+    Transparency is kept, so a logo with a clear background stays clear.
+    Falls back to src itself if Pillow is missing or the cache can't be written.
+    """
+    # .v2: copies written before transparency was kept had it flattened away
+    cache = src.with_suffix(".v2.cache.png")
+    try:
+        if cache.stat().st_mtime >= src.stat().st_mtime:
+            return cache
+    except OSError:
+        pass
+    try:
+        from PIL import Image
+        with Image.open(src) as im:
+            im = im.convert(_logo_mode(im))
+            iw, ih = im.size
+            im.thumbnail((LOGO_CACHE_WIDTH, max(1, int(LOGO_CACHE_WIDTH * ih / iw))))
+            im.save(cache, "PNG", optimize=True)
+    except (ImportError, OSError):
+        return src
+    return cache
+
+
+def _shrink_logo_bytes(data: bytes) -> bytes:
+    """data re-encoded as a PNG at most LOGO_CACHE_WIDTH wide, keeping transparency.
+
+    The remote logo is served 1920 px wide; every quote would otherwise
+    decode it and compress all those pixels into its image XObject.
+    Returns data unchanged if it is already small or Pillow can't read it.
+    """
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as im:
+            iw, ih = im.size
+            if iw <= LOGO_CACHE_WIDTH:
+                return data
+            im = im.convert(_logo_mode(im))
+            im.thumbnail((LOGO_CACHE_WIDTH, max(1, int(LOGO_CACHE_WIDTH * ih / iw))))
+            out = io.BytesIO()
+            im.save(out, "PNG", optimize=True)
+            return out.getvalue()
+    except (ImportError, OSError):
+        return data
+
+
+REMOTE_LOGO_MAX_AGE = 24 * 3600  # seconds a downloaded logo is used before revalidating
+
+
+def _fetch_remote_logo() -> bytes | None:
+    """BRAND_LOGO_URL's bytes, downscaled and kept on disk in CACHE_DIR between runs.
+
+    A copy younger than REMOTE_LOGO_MAX_AGE is used without touching the
+    network. An older one is revalidated with its ETag, so an unchanged logo
+    costs a 304 rather than a download. If the fetch fails, a stale copy beats
+    no logo.
+    """
+    cache = CACHE_DIR / f"logo-{hashlib.sha256(BRAND_LOGO_URL.encode()).hexdigest()[:16]}"
+    etag_file = cache.with_suffix(".etag")
+    try:
+        cached = cache.read_bytes()
+        fresh = time.time() - cache.stat().st_mtime < REMOTE_LOGO_MAX_AGE
+    except OSError:
+        cached, fresh = None, False
+    if fresh:
+        return cached
+
+    req = urllib.request.Request(BRAND_LOGO_URL)
+    if cached is not None:
+        try:
+            req.add_header("If-None-Match", etag_file.read_text().strip())
+        except OSError:
+            pass
+    try:
+        with urllib.request.urlopen(req, timeout=8) as resp:
+            data = resp.read()
+            etag = resp.headers.get("ETag")
+    except urllib.error.HTTPError as exc:
+        if exc.code == 304 and cached is not None:
+            try:
+                os.utime(cache)  # still current: fresh for another REMOTE_LOGO_MAX_AGE
+            except OSError:
+                pass
+        return cached
+    except Exception:
+        return cached
+
+    data = _shrink_logo_bytes(data)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_suffix(f".{os.getpid()}.tmp")  # render workers may race on it
+        tmp.write_bytes(data)
+        os.replace(tmp, cache)
+        if etag:
+            etag_file.write_text(etag)
+        else:
+            etag_file.unlink(missing_ok=True)
+    except OSError:
+        pass
+    return data
+
+
+def _remote_logo_reader():
+    """ImageReader for BRAND_LOGO_URL, loaded at most once per process."""
+    reader = _LOGO_CACHE.get(BRAND_LOGO_URL)
+    if reader is not None:
+        return reader or None
+    data = _fetch_remote_logo()
+    try:
+        reader = ImageReader(io.BytesIO(data)) if data else False
+    except Exception:
+        reader = False
+    _LOGO_CACHE[BRAND_LOGO_URL] = reader
+    return reader or None
+
+
+def _logo_reader(logo_path: Path):
+    """Decoded ImageReader for the local logo, else the remote one, else None.
+
+    drawImage takes the reader directly, so each quote reuses the decoded
+    pixels instead of reopening the file.
+    """
+    if logo_path.exists():
+        key = str(logo_path.resolve())
+        reader = _LOGO_CACHE.get(key)
+        if reader is not None:
+            return reader
+        try:
+            reader = _LOGO_CACHE[key] = ImageReader(key)
+            return reader
+        except Exception:
+            pass
+    return _remote_logo_reader()
+
+
 def generate_pdf(data: dict, logo_path: Path, out_path: Path):
-    c = rl_canvas.Canvas(str(out_path), pagesize=A4)
+    """Render the quote and write it to out_path in one go.
+
+    The file is written beside out_path and renamed into place, so an
+    interrupted run never leaves a half-written PDF behind.
+    """
+    pdf_bytes = generate_pdf_bytes(data, logo_path, out_path.stem)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    tmp.write_bytes(pdf_bytes)
+    os.replace(tmp, out_path)
+    print(f"[ok] Quote saved: {out_path}")
+
+
+def generate_pdf_bytes(data: dict, logo_path: Path, title: str) -> bytes:
+    """Render the quote in memory and return the PDF bytes.
+
+    title is shown as the heading, with - and _ read as spaces (the output
+    file's stem, for the CLI).
+    """
+    _load_reportlab()
+    buf = io.BytesIO()
+    c = rl_canvas.Canvas(buf, pagesize=A4, pageCompression=1)
     y = PAGE_H - MARGIN  # cursor starts at top
-    remote_logo_reader = None
 
     def down(delta):
         nonlocal y
@@ -694,24 +1576,16 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
         if redraw:
             redraw()
 
-    def get_remote_logo_reader():
-        nonlocal remote_logo_reader
-        if remote_logo_reader is not None:
-            return remote_logo_reader
-        try:
-            with urllib.request.urlopen(BRAND_LOGO_URL, timeout=8) as resp:
-                remote_logo_reader = ImageReader(io.BytesIO(resp.read()))
-        except Exception:
-            remote_logo_reader = False
-        return remote_logo_reader or None
+    def draw_lines(x, top_y, lines, leading=LINE_LEADING):
+        """Draw lines downwards from top_y as one text object, in the current font and fill."""
+        t = c.beginText(x, top_y)
+        t.setLeading(leading)
+        for line in lines:
+            t.textLine(line)
+        c.drawText(t)
 
     def get_brand_logo_reader():
-        if logo_path.exists():
-            try:
-                return ImageReader(str(logo_path))
-            except Exception:
-                pass
-        return get_remote_logo_reader()
+        return _logo_reader(logo_path)
 
     def draw_brand_logo(*args, draw=True):
         """Draw logo and return width.
@@ -763,11 +1637,13 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     down(logo_h + 8 * mm)
 
     # ── Title (mirrors output file name) ─────────────────────────────────────
-    title_text = out_path.stem.replace("_", " ").replace("-", " ").upper()
+    title_text = title.replace("_", " ").replace("-", " ").upper()
     c.setFillColor(NAVY)
+    # Largest whole size from 19 down to 10 that fits; width scales linearly with size
+    title_em = text_width(title_text, FONT_XB, 1000)
     font_size = 19
-    while font_size > 10 and c.stringWidth(title_text, FONT_XB, font_size) > CONTENT_W:
-        font_size -= 1
+    if title_em * font_size / 1000 > CONTENT_W:
+        font_size = max(10, int(CONTENT_W * 1000 / title_em))
     c.setFont(FONT_XB, font_size)
     c.drawCentredString(PAGE_W / 2, y, title_text)
     down(6 * mm)
@@ -796,17 +1672,13 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     down(5 * mm)
     c.setFont(FONT_R, 9)
     c.setFillColor(TEXT_GREY)
-    addr_lines = [
-        l.strip()
-        for l in (supplier_address or "").split("\n")
-        if l.strip()
-    ][:6]
-    for al in addr_lines:
-        c.drawString(col1_x, y, al)
-        down(4.5 * mm)
+    # First six non-blank lines; islice stops stripping once it has them
+    addr_lines = list(itertools.islice(
+        filter(None, map(str.strip, supplier_address.split("\n"))), 6))
     if supplier_email:
-        c.drawString(col1_x, y, supplier_email)
-        down(4.5 * mm)
+        addr_lines.append(supplier_email)
+    draw_lines(col1_x, y, addr_lines)
+    down(LINE_LEADING * len(addr_lines))
     bottom_left = y
 
     # Right – From
@@ -819,9 +1691,8 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     y -= 5 * mm
     c.setFont(FONT_R, 9)
     c.setFillColor(TEXT_GREY)
-    for we_line in WE_ADDRESS:
-        c.drawString(col2_x, y, we_line)
-        y -= 4.5 * mm
+    draw_lines(col2_x, y, WE_ADDRESS)
+    y -= LINE_LEADING * len(WE_ADDRESS)
     bottom_right = y
 
     y = min(bottom_left, bottom_right)
@@ -830,7 +1701,7 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     # ── Prepared By (2-line layout to avoid overflow) ────────────────────────
     prep_h = 17 * mm
     ensure_space(prep_h + 6 * mm)
-    rounded_rect(c, MARGIN, y - prep_h, CONTENT_W, prep_h, fill=colors.HexColor("#f5f7f9"))
+    rounded_rect(c, MARGIN, y - prep_h, CONTENT_W, prep_h, fill=PREP_BG)
     label(c, MARGIN + 3 * mm, y - 4 * mm, "Prepared By")
     c.setFont(FONT_B, 9)
     c.setFillColor(NAVY)
@@ -866,34 +1737,61 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     down(box_h + 8 * mm)
 
     # ── Products & Services table ────────────────────────────────────────────
-    col_w = [CONTENT_W * 0.50, CONTENT_W * 0.11, CONTENT_W * 0.19, CONTENT_W * 0.20]
     headers = ["PRODUCTS & SERVICES", "QUANTITY", "PRICE PER UNIT", "LINE TOTAL"]
-    hdr_h = 9 * mm
-    row_h = 8 * mm
+    hdr_h = TABLE_HDR_H
+    row_h = TABLE_ROW_H
+    desc_x = MARGIN + CELL_PAD
+    qty_x, unit_x, total_x = (x - CELL_PAD for x in TABLE_COL_X[2:])
+    max_desc = TABLE_COL_W[0] - 2 * CELL_PAD
 
     def draw_table_header():
         nonlocal y
-        rounded_rect(c, MARGIN, y - hdr_h, CONTENT_W, hdr_h, r=2 * mm, fill=NAVY)
+        rounded_rect(c, MARGIN, y - hdr_h, CONTENT_W, hdr_h, r=RADIUS, fill=NAVY)
         c.setFont(FONT_B, 8)
         c.setFillColor(WHITE)
-        hx = MARGIN + 3 * mm
-        for i, hdr in enumerate(headers):
-            if i == 0:
-                c.drawString(hx, y - hdr_h + 2.5 * mm, hdr)
-            else:
-                c.drawRightString(hx + col_w[i] - 3 * mm, y - hdr_h + 2.5 * mm, hdr)
-            hx += col_w[i]
+        text_y = y - hdr_h + TEXT_RISE
+        c.drawString(desc_x, text_y, headers[0])
+        for x, hdr in zip(TABLE_COL_X[2:], headers[1:]):
+            c.drawRightString(x, text_y, hdr)
         down(hdr_h)
 
+    def draw_row_backgrounds(first, count):
+        """Zebra fills and separators for the next count rows, batched into
+        one path per fill colour and one stroked path per line weight.
+
+        Drawn row by row, each row's fill covered the lower half of the
+        separator above it. With the fills batched first, that is reproduced
+        by stroking only the visible upper half of the between-row lines;
+        the last separator, which nothing covers, keeps its full width.
+        """
+        for parity, fill in ((0, LIGHT_ROW), (1, WHITE)):
+            rows = [i for i in range(count) if (first + i) % 2 == parity]
+            if not rows:
+                continue
+            p = c.beginPath()
+            for i in rows:
+                p.rect(MARGIN, y - (i + 1) * row_h, CONTENT_W, row_h)
+            c.setFillColor(fill)
+            c.drawPath(p, fill=1, stroke=0)
+        c.setStrokeColor(MID_GREY)
+        if count > 1:
+            p = c.beginPath()
+            for i in range(1, count):
+                line_y = y - i * row_h + SEPARATOR_W / 4
+                p.moveTo(MARGIN, line_y)
+                p.lineTo(MARGIN + CONTENT_W, line_y)
+            c.setLineWidth(SEPARATOR_W / 2)
+            c.drawPath(p, fill=0, stroke=1)
+        c.setLineWidth(SEPARATOR_W)
+        c.line(MARGIN, y - count * row_h, MARGIN + CONTENT_W, y - count * row_h)
+
     ensure_space(hdr_h)
     draw_table_header()
 
-    # Data rows
+    # Pre-pass: parse, total and format every row before anything is drawn
+    rows = []  # (description, quantity, unit price, line total) as display strings
     grand_total = 0.0
-    line_items = data.get("line_items") or []
-    for idx, item in enumerate(line_items):
-        ensure_space(row_h, redraw=draw_table_header)
-
+    for item in data.get("line_items") or []:
         desc = str(item.get("description") or "")
         qty = item.get("quantity", 1)
         try:
@@ -913,37 +1811,51 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
 
         grand_total += total
 
-        row_fill = LIGHT_ROW if idx % 2 == 0 else WHITE
-        c.setFillColor(row_fill)
-        c.rect(MARGIN, y - row_h, CONTENT_W, row_h, fill=1, stroke=0)
-        c.setStrokeColor(MID_GREY)
-        c.setLineWidth(0.3)
-        c.line(MARGIN, y - row_h, MARGIN + CONTENT_W, y - row_h)
-
-        text_y = y - row_h + 2.5 * mm
-        max_desc = col_w[0] - 6 * mm
-
-        # Truncate description if too wide
-        desc_str = desc
-        c.setFont(FONT_R, 9)
-        while desc_str and c.stringWidth(desc_str, FONT_R, 9) > max_desc:
-            desc_str = desc_str[:-1]
-        if desc_str != desc and len(desc_str) > 1:
-            desc_str = desc_str[:-1] + "…"
-
-        c.setFillColor(DARK_GREY)
-        c.drawString(MARGIN + 3 * mm, text_y, desc_str)
-
-        rx = MARGIN + col_w[0]
-        c.setFont(FONT_R, 9)
-        c.drawRightString(rx + col_w[1] - 3 * mm, text_y, str(int(qty_f) if qty_f.is_integer() else qty_f))
-        rx += col_w[1]
-        c.drawRightString(rx + col_w[2] - 3 * mm, text_y, money(unit))
-        rx += col_w[2]
-        c.setFont(FONT_B, 9)
-        c.drawRightString(rx + col_w[3] - 3 * mm, text_y, money(total))
-
-        down(row_h)
+        # Truncate description if too wide: bisect for the longest prefix that
+        # fits, then swap its last character for an ellipsis. Short ASCII
+        # descriptions are known to fit from their length alone.
+        if not _fits_by_length(desc, FONT_R, 9, max_desc):
+            cut = _fit_prefix(desc, FONT_R, 9, max_desc)
+            if cut < len(desc):
+                desc = desc[:cut - 1] + "…" if cut > 1 else desc[:cut]
+
+        qty_str = str(int(qty_f) if qty_f.is_integer() else qty_f)
+        rows.append((desc, qty_str, money(unit), money(total)))
+
+    # Data rows, one page-sized chunk at a time: the page break (if any) and
+    # the chunk's backgrounds are handled up front, then all of the chunk's
+    # cells go into a single text object instead of a BT/ET block per cell.
+    # Right-aligned cells are positioned from the cached glyph widths.
+    font_r, font_b = FONT_R, FONT_B
+    start = 0
+    while start < len(rows):
+        ensure_space(row_h, redraw=draw_table_header)
+        end, room = start, y
+        while end < len(rows) and (room - MARGIN) >= row_h:
+            room -= row_h
+            end += 1
+        draw_row_backgrounds(start, end - start)
+
+        chunk = rows[start:end]
+        text = c.beginText()
+        move, out, set_font = text.setTextOrigin, text.textOut, text.setFont
+        text.setFillColor(DARK_GREY)
+        text_y = y - row_h + TEXT_RISE
+        for desc, qty_str, unit_str, total_str in chunk:
+            set_font(font_r, 9)
+            move(desc_x, text_y)
+            out(desc)
+            move(qty_x - text_width(qty_str, font_r, 9), text_y)
+            out(qty_str)
+            move(unit_x - text_width(unit_str, font_r, 9), text_y)
+            out(unit_str)
+            set_font(font_b, 9)
+            move(total_x - text_width(total_str, font_b, 9), text_y)
+            out(total_str)
+            text_y -= row_h
+        c.drawText(text)
+        down(row_h * len(chunk))
+        start = end
 
     down(6 * mm)
 
@@ -954,6 +1866,7 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     tot_h = 14 * mm
 
     ensure_space(sub_h + 2 * mm + tot_h + 10 * mm)
+    grand_total_str = money(grand_total)  # shown in both boxes
 
     # Subtotal (light green background)
     rounded_rect(c, sum_x, y - sub_h, sum_w, sub_h, fill=GREEN_LIGHT)
@@ -961,7 +1874,7 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     c.setFillColor(NAVY)
     c.drawString(sum_x + 4 * mm, y - sub_h + 3 * mm, "One-time subtotal")
     c.setFont(FONT_B, 9)
-    c.drawRightString(sum_x + sum_w - 4 * mm, y - sub_h + 3 * mm, money(grand_total))
+    c.drawRightString(sum_x + sum_w - 4 * mm, y - sub_h + 3 * mm, grand_total_str)
     down(sub_h + 2 * mm)
 
     # Total (green, larger)
@@ -971,7 +1884,7 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     c.drawString(sum_x + 5 * mm, y - tot_h / 2 - 1.5 * mm, "TOTAL")
     c.setFont(FONT_XB, 15)
     c.setFillColor(NAVY)
-    c.drawRightString(sum_x + sum_w - 5 * mm, y - tot_h / 2 - 2.5 * mm, money(grand_total))
+    c.drawRightString(sum_x + sum_w - 5 * mm, y - tot_h / 2 - 2.5 * mm, grand_total_str)
     down(tot_h + 10 * mm)
 
     # ── Caveats / Comments ───────────────────────────────────────────────────
@@ -994,14 +1907,12 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
             down(comm_h)
             break
 
-        note_y = y - 11 * mm
-        box_bottom = y - comm_h + 4 * mm
+        # First baseline 11 mm down, last no lower than 4 mm above the box bottom
         c.setFont(FONT_R, 9)
         c.setFillColor(TEXT_GREY)
-        while note_idx < len(note_lines) and note_y >= box_bottom:
-            c.drawString(MARGIN + 4 * mm, note_y, note_lines[note_idx])
-            note_idx += 1
-            note_y -= 4.5 * mm
+        fits = min(len(note_lines) - note_idx, int((comm_h - 15 * mm) // LINE_LEADING) + 1)
+        draw_lines(MARGIN + 4 * mm, y - 11 * mm, note_lines[note_idx:note_idx + fits])
+        note_idx += fits
 
         down(comm_h)
         if note_idx >= len(note_lines):
@@ -1012,11 +1923,118 @@ def generate_pdf(data: dict, logo_path: Path, out_path: Path):
     draw_footer()
 
     c.save()
-    print(f"[ok] Quote saved: {out_path}")
+    return buf.getvalue()
 
 
 # ─── entry point ─────────────────────────────────────────────────────────────
 
+class _SlugTable(dict):
+    """str.translate table for slugify: alphanumerics (Unicode-aware, as
+    str.isalnum) and "-" pass through, everything else becomes a space.
+    Entries are filled in on first sight of each code point."""
+
+    def __missing__(self, cp):
+        ch = chr(cp)
+        self[cp] = out = cp if (ch.isalnum() or ch == "-") else " "
+        return out
+
+
+_SLUG_TRANS = _SlugTable()
+
+
+def _prepare_quote(data: dict, job_name: str = None, out: str = None) -> Path:
+    """Apply the job name override, print the extraction summary, return the output path."""
+    if job_name:
+        data["job_name"] = job_name
+
+    print(f"  Client    : {data.get('client_name', '–')}")
+    print(f"  Reference : {data.get('reference_number', '–')}")
+    print(f"  Expiry    : {data.get('quote_expiry_date', '–')}")
+    print(f"  Items     : {len(data.get('line_items') or [])}")
+
+    # Output path
+    if out:
+        return Path(out)
+    client = (data.get("client_name") or "customer").strip().lower()
+    postcode = (data.get("site_postcode") or "unknown-postcode").strip().lower()
+
+    def slugify(val: str) -> str:
+        slug = "-".join((val or "").translate(_SLUG_TRANS).split())
+        return slug[:60] or "quote"
+
+    return SCRIPT_DIR / f"{slugify(client)}-{slugify(postcode)}.pdf"
+
+
+def render_quote(data: dict, logo_path: Path, job_name: str = None, out: str = None):
+    """Print the extraction summary and write the quote PDF for one PO."""
+    out_path = _prepare_quote(data, job_name, out)
+    print("Rendering PDF...")
+    generate_pdf(data, logo_path, out_path)
+
+
+def _init_render_worker(logo_failed: bool):
+    """Render worker start-up: fonts, plus the parent's failed remote logo fetch.
+
+    A worker that knows the fetch already failed draws no logo rather than
+    spending another timeout on it; a successful one is read from CACHE_DIR.
+    """
+    ensure_fonts()
+    if logo_failed:
+        _LOGO_CACHE[BRAND_LOGO_URL] = False
+
+
+def render_quotes(extracted: dict, logo_path: Path, job_name: str = None, out: str = None):
+    """Write a quote for each {pdf_path: data}, rendering in parallel processes.
+
+    ReportLab rendering is CPU-bound, so separate processes sidestep the GIL.
+    Each worker registers the fonts once on start-up.
+    """
+    jobs = {}  # out_path -> (pdf_path, data)
+    for pdf_in, data in extracted.items():
+        print(f"\n── {pdf_in.name}")
+        out_path = _prepare_quote(data, job_name, out)
+        if out_path in jobs:
+            # Same client and postcode: the later PO overwrote the earlier one
+            # when rendering was sequential, so keep that behaviour explicitly.
+            print(f"  [!] Same output file as {jobs[out_path][0].name}; this quote replaces it")
+            del jobs[out_path]
+        jobs[out_path] = (pdf_in, data)
+
+    if len(jobs) == 1:
+        out_path, (_, data) = jobs.popitem()
+        print("Rendering PDF...")
+        generate_pdf(data, logo_path, out_path)
+        return
+
+    print(f"\nRendering {len(jobs)} PDFs...")
+    workers = min(PDF_WORKERS, len(jobs))
+    logo_failed = _LOGO_CACHE.get(BRAND_LOGO_URL) is False
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                             initargs=(logo_failed,)) as pool:
+        list(pool.map(
+            generate_pdf,
+            [data for _, data in jobs.values()],
+            itertools.repeat(logo_path),
+            list(jobs),
+        ))
+
+
+def _collect_pdfs(inputs: list) -> list:
+    """Input paths with any directories expanded to the PDFs directly inside them."""
+    pdf_paths = []
+    for p in map(Path, inputs):
+        if p.is_dir():
+            found = sorted(f for f in p.iterdir() if f.suffix.lower() == ".pdf" and f.is_file())
+            if not found:
+                sys.exit(f"No PDFs found in: {p}")
+            pdf_paths.extend(found)
+        elif not p.exists():
+            sys.exit(f"File not found: {p}")
+        else:
+            pdf_paths.append(p)
+    return list(dict.fromkeys(pdf_paths))  # drop repeats, keep order
+
+
 def main():
     ap = argparse.ArgumentParser(
         description="Waste Experts Quote Generator",
@@ -1025,63 +2043,89 @@ def main():
             "Examples:\n"
             "  python generate_quote.py po.pdf\n"
             "  python generate_quote.py po.pdf --job-name 'Fluorescent Tube Collection'\n"
-            "  python generate_quote.py po.pdf --out quote-final.pdf"
+            "  python generate_quote.py po.pdf --out quote-final.pdf\n"
+            "  python generate_quote.py po1.pdf po2.pdf po3.pdf --batch-api\n"
+            "  python generate_quote.py incoming-pos/\n"
+            "  python generate_quote.py po1.pdf po2.pdf po3.pdf --group"
         ),
     )
-    ap.add_argument("input_pdf", help="Supplier purchase order PDF to read")
+    ap.add_argument("input_pdf", nargs="+", help="Supplier purchase order PDF(s), or folders of them, to read")
     ap.add_argument("--job-name", help="Override the quote title")
-    ap.add_argument("--out", help="Output PDF path (default: auto-generated)")
+    ap.add_argument("--out", help="Output PDF path (default: auto-generated; single input only)")
+    ap.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="Extract through the Message Batches API: half price, but results can take minutes to hours",
+    )
+    ap.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore stored extractions and send every PO to Claude again",
+    )
+    ap.add_argument(
+        "--group",
+        type=int,
+        nargs="?",
+        const=GROUP_SIZE,
+        metavar="N",
+        help=f"Send N POs per Claude request (default {GROUP_SIZE}): fewer requests, longer replies",
+    )
     args = ap.parse_args()
 
-    pdf_in = Path(args.input_pdf)
-    if not pdf_in.exists():
-        sys.exit(f"File not found: {pdf_in}")
+    pdf_paths = _collect_pdfs(args.input_pdf)
+    if args.out and len(pdf_paths) > 1:
+        ap.error("--out can only be used with a single input PDF")
+    if args.group is not None and (args.group < 1 or args.batch_api):
+        ap.error("--group takes a positive N and can't be combined with --batch-api")
 
     print("Checking fonts...")
     ensure_fonts()
 
-    print(f"Extracting data from:  {pdf_in.name}")
-    data = extract(pdf_in)
-
-    if args.job_name:
-        data["job_name"] = args.job_name
-
-    print(f"  Client    : {data.get('client_name', '–')}")
-    print(f"  Reference : {data.get('reference_number', '–')}")
-    print(f"  Expiry    : {data.get('quote_expiry_date', '–')}")
-    print(f"  Items     : {len(data.get('line_items') or [])}")
-
-    # Logo: prefer the WhatsApp image, fall back to generic names
-    logo_path = next(
-        (
-            p
-            for pattern in (
-                "WhatsApp_Image_*.jpeg",
-                "WhatsApp_Image_*.jpg",
-                "logo.png",
-                "logo.jpg",
-            )
-            for p in SCRIPT_DIR.glob(pattern)
-        ),
-        SCRIPT_DIR / "logo.png",
-    )
-
-    # Output path
-    if args.out:
-        out_path = Path(args.out)
+    logo_path = _find_logo()
+    logo_fetch = None
+    if logo_path.exists():
+        logo_path = _get_cached_logo(logo_path)
     else:
-        client = (data.get("client_name") or "customer").strip().lower()
-        postcode = (data.get("site_postcode") or "unknown-postcode").strip().lower()
-
-        def slugify(val: str) -> str:
-            cleaned = "".join(ch if (ch.isalnum() or ch in " -_") else " " for ch in (val or ""))
-            slug = "-".join(part for part in cleaned.replace("_", " ").split() if part)
-            return slug[:60] or "quote"
-
-        out_path = SCRIPT_DIR / f"{slugify(client)}-{slugify(postcode)}.pdf"
-
-    print("Rendering PDF...")
-    generate_pdf(data, logo_path, out_path)
+        # No local logo: load the remote one into _LOGO_CACHE (and CACHE_DIR)
+        # while Claude reads the POs, so rendering neither waits for it nor,
+        # if the fetch failed, tries again
+        pool = ThreadPoolExecutor(max_workers=1)
+        logo_fetch = pool.submit(_remote_logo_reader)
+        pool.shutdown(wait=False)
+
+    cached = {} if args.fresh else extract_cached(pdf_paths)
+    todo = [p for p in pdf_paths if p not in cached]
+
+    if len(pdf_paths) == 1 and not args.batch_api:
+        if todo:
+            print(f"Extracting data from:  {pdf_paths[0].name}")
+            cached[pdf_paths[0]] = extract(pdf_paths[0])
+        if logo_fetch:
+            logo_fetch.result()
+        render_quote(cached[pdf_paths[0]], logo_path, job_name=args.job_name, out=args.out)
+        return
+
+    if not todo:
+        fresh = {}
+    elif args.batch_api:
+        print(f"Extracting {len(todo)} PO(s) via the Message Batches API...")
+        fresh = extract_batch(todo)
+    elif args.group:
+        print(f"Extracting {len(todo)} PO(s), {args.group} per request...")
+        fresh = extract_grouped(todo, args.group)
+    else:
+        print(f"Extracting {len(todo)} PO(s), up to {EXTRACT_CONCURRENCY} at a time...")
+        fresh = extract_many(todo)
+    cached.update(fresh)
+    extracted = {p: cached[p] for p in pdf_paths if cached.get(p) is not None}
+
+    if logo_fetch:
+        logo_fetch.result()
+    if extracted:
+        render_quotes(extracted, logo_path, job_name=args.job_name, out=args.out)
+    failed = len(pdf_paths) - len(extracted)
+    if failed:
+        sys.exit(f"{failed} of {len(pdf_paths)} PO(s) could not be extracted")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import generate_quote  # noqa: E402
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_cached_logo_keeps_transparency(tmp_path):
+    src = tmp_path / "logo.png"
+    im = Image.new("RGBA", (generate_quote.LOGO_CACHE_WIDTH * 2, 200), (0, 0, 0, 0))
+    im.paste((142, 196, 49, 255), (100, 50, 300, 150))
+    im.save(src)
+
+    cache = generate_quote._get_cached_logo(src)
+
+    assert cache != src
+    with Image.open(cache) as out:
+        assert out.mode == "RGBA"
+        assert out.width == generate_quote.LOGO_CACHE_WIDTH
+        assert out.getpixel((0, 0))[3] == 0
+        assert out.getpixel((100, 50))[3] == 255
+
+
+def test_cached_logo_keeps_palette_transparency(tmp_path):
+    src = tmp_path / "logo.png"
+    im = Image.new("P", (40, 20), 0)
+    im.putpalette([255, 255, 255, 142, 196, 49] + [0] * 762)
+    im.paste(1, (10, 5, 30, 15))
+    im.save(src, transparency=0)
+
+    with Image.open(generate_quote._get_cached_logo(src)) as out:
+        assert out.mode == "RGBA"
+        assert out.getpixel((0, 0))[3] == 0
+        assert out.getpixel((20, 10)) == (142, 196, 49, 255)
+
+
+def test_opaque_logo_stays_rgb(tmp_path):
+    src = tmp_path / "logo.jpg"
+    Image.new("RGB", (40, 20), (30, 46, 61)).save(src)
+
+    with Image.open(generate_quote._get_cached_logo(src)) as out:
+        assert out.mode == "RGB"